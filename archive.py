@@ -0,0 +1,184 @@
+"""Monthly archival of completed tasks.
+
+Completed tasks whose due time is older than a cutoff are moved out of the
+hot `tasks` table into one table per month (`tasks_archive_YYYY_MM`). The
+`archive_partitions` catalog records the time range of every partition so
+readers only open the partitions a query actually needs.
+
+Rows are moved in small transactions with the database in WAL mode, so the
+app keeps reading and writing while an archive run is in progress.
+
+Usage:
+    python archive.py --older-than-days 90
+"""
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+TIME_FORMAT = "%Y-%m-%d %H:%M"
+
+
+def ensure_catalog(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archive_partitions (
+            name TEXT PRIMARY KEY,
+            month TEXT UNIQUE NOT NULL,
+            first_time DATETIME NOT NULL,
+            last_time DATETIME NOT NULL,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Lets the archiver find old completed tasks without a full scan
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status_time ON tasks(status, time)")
+
+
+def partition_name(month):
+    """Table name for a 'YYYY-MM' month."""
+    return "tasks_archive_" + month.replace('-', '_')
+
+
+def task_columns(cursor, table='tasks'):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def partitions_for_range(cursor, start=None, end=None):
+    """Names of archive partitions holding tasks due within [start, end)."""
+    query = "SELECT name FROM archive_partitions WHERE row_count > 0"
+    params = []
+    if start is not None:
+        query += " AND last_time >= ?"
+        params.append(start)
+    if end is not None:
+        query += " AND first_time < ?"
+        params.append(end)
+    cursor.execute(query + " ORDER BY month", params)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def tasks_source(cursor, include_archive=True, start=None, end=None):
+    """SQL expression selecting tasks from the hot table and matching partitions.
+
+    Use it as `SELECT ... FROM {source} AS tasks`.
+    """
+    partitions = partitions_for_range(cursor, start, end) if include_archive else []
+    if not partitions:
+        return "tasks"
+    columns = ', '.join(task_columns(cursor))
+    selects = [f"SELECT {columns} FROM tasks"]
+    selects += [f"SELECT {columns} FROM {name}" for name in partitions]
+    return "(" + " UNION ALL ".join(selects) + ")"
+
+
+class TaskArchiver:
+    def __init__(self, get_connection, batch_size=500, pause=0.05):
+        self.get_connection = get_connection
+        self.batch_size = batch_size
+        self.pause = pause
+
+    def _ensure_partition(self, c, month, columns):
+        name = partition_name(month)
+        # Copy the column layout of `tasks` without its constraints
+        c.execute(f"CREATE TABLE IF NOT EXISTS {name} AS SELECT {', '.join(columns)} FROM tasks WHERE 0")
+        c.execute(f"CREATE INDEX IF NOT EXISTS idx_{name}_time ON {name}(time)")
+        return name
+
+    def _move_batch(self, conn, cutoff):
+        c = conn.cursor()
+        # Take the write lock up front so the batch can't fail half-way on a busy database
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            c.execute('''
+                SELECT id, time FROM tasks
+                WHERE status = 'completed' AND time < ?
+                ORDER BY time LIMIT ?
+            ''', (cutoff, self.batch_size))
+            rows = c.fetchall()
+            if not rows:
+                conn.rollback()
+                return 0
+
+            columns = task_columns(c)
+            by_month = {}
+            for task_id, task_time in rows:
+                by_month.setdefault(task_time[:7], []).append((task_id, task_time))
+
+            for month, month_rows in by_month.items():
+                name = self._ensure_partition(c, month, columns)
+                ids = [task_id for task_id, _ in month_rows]
+                placeholders = ','.join(['?' for _ in ids])
+                c.execute(f'''
+                    INSERT INTO {name} ({', '.join(columns)})
+                    SELECT {', '.join(columns)} FROM tasks WHERE id IN ({placeholders})
+                ''', ids)
+                c.execute(f"DELETE FROM tasks WHERE id IN ({placeholders})", ids)
+
+                times = [task_time for _, task_time in month_rows]
+                c.execute('''
+                    INSERT INTO archive_partitions (name, month, first_time, last_time, row_count)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(name) DO UPDATE SET
+                        first_time = MIN(first_time, excluded.first_time),
+                        last_time = MAX(last_time, excluded.last_time),
+                        row_count = row_count + excluded.row_count,
+                        archived_at = CURRENT_TIMESTAMP
+                ''', (name, month, min(times), max(times), len(ids)))
+            conn.commit()
+            return len(rows)
+        except Exception:
+            conn.rollback()
+            raise
+
+    def archive(self, older_than_days):
+        """Move completed tasks due more than `older_than_days` ago into monthly partitions."""
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).strftime(TIME_FORMAT)
+        started = time.perf_counter()
+
+        conn = self.get_connection()
+        # Manage transactions explicitly; WAL keeps readers and other writers unblocked
+        conn.isolation_level = None
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        ensure_catalog(conn.cursor())
+
+        moved = 0
+        batches = 0
+        try:
+            while True:
+                count = self._move_batch(conn, cutoff)
+                if not count:
+                    break
+                moved += count
+                batches += 1
+                # Give waiting writers a turn between batches
+                time.sleep(self.pause)
+        finally:
+            conn.close()
+
+        return {
+            'cutoff': cutoff,
+            'moved': moved,
+            'batches': batches,
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive old completed tasks into monthly partitions.")
+    parser.add_argument('--db', default=os.getenv("GOGGINS_DB_PATH", "goggins_bot.db"))
+    parser.add_argument('--older-than-days', type=int,
+                        default=int(os.getenv("GOGGINS_ARCHIVE_AFTER_DAYS", "90")))
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args(argv)
+
+    archiver = TaskArchiver(lambda: sqlite3.connect(args.db), batch_size=args.batch_size)
+    report = archiver.archive(args.older_than_days)
+    print(f"Archived {report['moved']} tasks due before {report['cutoff']} "
+          f"in {report['batches']} batches ({report['seconds']}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+"""Reproducible benchmarks for the Goggins Task Manager data layer.
+
+Generates a synthetic database in the app's schema, then times every
+DatabaseManager method, the analytics computation and each export format
+without Streamlit and with a stub LLM in place of Groq.
+
+Usage:
+    python benchmark.py                      # default profile
+    python benchmark.py --profile large
+    python benchmark.py --tasks 50000 --chat-messages 2000 --output results.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# example.py builds a Groq client at import time; the key is never used
+# because the model is replaced by StubLLM below.
+os.environ.setdefault("GROQ_API_KEY", "benchmark-stub")
+
+import example  # noqa: E402
+import maintenance  # noqa: E402
+
+PROFILES = {
+    'small': {'tasks': 1000, 'categories': 5, 'days': 60, 'chat_messages': 100},
+    'default': {'tasks': 10000, 'categories': 12, 'days': 365, 'chat_messages': 1000},
+    'large': {'tasks': 100000, 'categories': 30, 'days': 1095, 'chat_messages': 10000},
+}
+
+DEFAULT_THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  'benchmark_thresholds.json')
+
+TASK_WORDS = ['gym', 'run', 'read', 'write', 'report', 'call', 'email', 'review',
+              'plan', 'study', 'clean', 'cook', 'meditate', 'code', 'deploy', 'budget']
+PRIORITIES = ['Low', 'Medium', 'High']
+EXPORT_FORMATS = ['Excel', 'CSV', 'JSON']
+
+
+class StubMessage:
+    def __init__(self, content):
+        self.content = content
+
+
+class StubLLM:
+    """Drop-in replacement for the ChatGroq model that answers instantly."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, prompt):
+        self.calls += 1
+        return StubMessage("STAY HARD! " + prompt[-1].content)
+
+
+def generate_database(path, tasks, categories, days, chat_messages,
+                      completed_ratio=0.6, seed=42):
+    """Create a synthetic database at `path` in the current schema."""
+    rng = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+
+    example.DB_PATH = path
+    example.DatabaseManager()
+
+    now = datetime.now()
+    start = now - timedelta(days=days)
+    category_names = [f"Category {i}" for i in range(categories)]
+
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.executemany(
+        "INSERT INTO categories (id, name) VALUES (?, ?)",
+        [(str(uuid.uuid4()), name) for name in category_names]
+    )
+
+    task_rows = []
+    for _ in range(tasks):
+        created = start + timedelta(seconds=rng.randint(0, days * 86400))
+        due = created + timedelta(hours=rng.randint(1, 14 * 24))
+        status = 'completed' if rng.random() < completed_ratio else 'pending'
+        name = ' '.join(rng.sample(TASK_WORDS, rng.randint(1, 3)))
+        notes = f"Notes for {name}" if rng.random() < 0.3 else ''
+        # Most tasks are finished a little early, some well after the deadline
+        completed_at = None
+        if status == 'completed':
+            finished = due + timedelta(minutes=int(rng.gauss(-120, 900)))
+            completed_at = max(finished, created).strftime("%Y-%m-%d %H:%M:%S")
+        task_rows.append((
+            str(uuid.uuid4()), name, due.strftime("%Y-%m-%d %H:%M"), status,
+            rng.choice(PRIORITIES), rng.choice(category_names), notes,
+            created.strftime("%Y-%m-%d %H:%M:%S"), completed_at
+        ))
+    c.executemany('''
+        INSERT INTO tasks (id, task, time, status, priority, category, notes, created_at, completed_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', task_rows)
+
+    chat_rows = []
+    for i in range(chat_messages):
+        sent = start + timedelta(seconds=int(i * days * 86400 / max(chat_messages, 1)))
+        role = 'user' if i % 2 == 0 else 'assistant'
+        content = ' '.join(rng.choice(TASK_WORDS) for _ in range(rng.randint(5, 60)))
+        chat_rows.append((str(uuid.uuid4()), role, content,
+                          sent.strftime("%Y-%m-%d %H:%M:%S")))
+    c.executemany(
+        "INSERT INTO chat_history (id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+        chat_rows
+    )
+
+    conn.commit()
+    conn.close()
+    return category_names
+
+
+def ranking_at_scale(pending, repeat, seed):
+    """Time ranking inserts and top-25 reads against a full DataFrame sort."""
+    rng = random.Random(seed)
+    now = datetime.now()
+    rows = [
+        (str(i), (now + timedelta(minutes=rng.randint(-14 * 1440, 14 * 1440))).strftime("%Y-%m-%d %H:%M"),
+         rng.choice(PRIORITIES), 'General')
+        for i in range(pending)
+    ]
+    ranking = example.TaskRanking(None, None)
+    ranking.ready = True
+    ranking.sync = lambda: None
+    for row in rows[:-repeat]:
+        ranking.add(*row)
+    add = time_call(lambda i: ranking.add(*rows[-repeat:][i]), repeat, setup=lambda i: i)
+
+    df = pd.DataFrame(rows, columns=['id', 'time', 'priority', 'category'])
+    df['time'] = pd.to_datetime(df['time'])
+    full_sort = time_call(lambda: df.sort_values(['time', 'priority'], ascending=[True, False]), repeat)
+    return add, time_call(lambda: ranking.top(25), repeat), full_sort
+
+
+def trends_kernels(completions, seed):
+    """Fold `completions` synthetic completions into a fresh trends engine and report."""
+    rng = np.random.default_rng(seed)
+    due = np.sort(rng.integers(1_600_000_000, 1_700_000_000, completions))
+    done = due + rng.normal(-7200, 54000, completions).astype(np.int64)
+    trends = example.CompletionTrends(None, None)
+    trends.record(due, done)
+    return trends.report()
+
+
+def dedup_at_scale(tasks, repeat, seed):
+    """Time indexing `tasks` distinct synthetic task names, then lookups against them."""
+    rng = random.Random(seed)
+    syllables = ['ba', 'do', 'fe', 'gu', 'hi', 'ja', 'ka', 'lo',
+                 'mi', 'ne', 'pa', 'ru', 'sa', 'ti', 'vo', 'ze']
+    vocabulary = list({''.join(rng.choices(syllables, k=rng.randint(2, 4))) for _ in range(20000)})
+    names = set()
+    while len(names) < tasks:
+        names.add(' '.join(rng.sample(vocabulary, 3)))
+    names = list(names)
+
+    index = example.DuplicateIndex(None, None)
+    index.ready = True
+    index.sync = lambda: None
+
+    def load():
+        for i, name in enumerate(names):
+            index.add(str(i), name)
+
+    build = time_call(load, 1)
+    # A query is an indexed name with one word left out
+    queries = [' '.join(rng.sample(name.split(), 2)) for name in rng.sample(names, repeat)]
+    return build, time_call(lambda i: index.similar(queries[i]), repeat, setup=lambda i: i)
+
+
+def time_call(fn, repeat, setup=None):
+    """Run `fn` `repeat` times and return timing stats in milliseconds."""
+    samples = []
+    for i in range(repeat):
+        arg = setup(i) if setup else None
+        start = time.perf_counter()
+        fn(arg) if setup else fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'runs': repeat,
+        'mean_ms': round(statistics.mean(samples), 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'min_ms': round(min(samples), 3),
+        'max_ms': round(max(samples), 3),
+    }
+
+
+def run_benchmarks(config, repeat):
+    """Time the data layer against a fresh synthetic database."""
+    results = {}
+    workdir = tempfile.mkdtemp(prefix='goggins_bench_')
+    db_path = os.path.join(workdir, 'goggins_bot.db')
+    category_names = generate_database(db_path, config['tasks'], config['categories'],
+                                       config['days'], config['chat_messages'],
+                                       seed=config['seed'])
+
+    stub = StubLLM()
+    example.chatgroq_model = stub
+    db = example.DatabaseManager()
+
+    results['init_database'] = time_call(db.init_database, repeat)
+    results['ensure_default_category'] = time_call(db.ensure_default_category, repeat)
+
+    # Cold runs drop the read cache first so they measure the SQL path
+    cold = lambda i: example.read_cache.invalidate()  # noqa: E731
+
+    results['get_categories'] = time_call(lambda _: db.get_categories(), repeat, setup=cold)
+    results['get_categories.cached'] = time_call(db.get_categories, repeat)
+    results['save_category'] = time_call(
+        lambda name: db.save_category(name), repeat,
+        setup=lambda i: f"Bench Category {i}"
+    )
+
+    results['get_tasks.pending'] = time_call(lambda _: db.get_tasks(), repeat, setup=cold)
+    results['get_tasks.pending.cached'] = time_call(db.get_tasks, repeat)
+    results['get_tasks.all'] = time_call(
+        lambda _: db.get_tasks(filter_completed=True), repeat, setup=cold
+    )
+    results['get_tasks.filtered'] = time_call(
+        lambda _: db.get_tasks(filter_completed=True,
+                               filter_category=category_names[:2],
+                               filter_priority=['High']),
+        repeat, setup=cold
+    )
+
+    due = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d %H:%M")
+    results['save_task'] = time_call(
+        lambda i: db.save_task({
+            'task': f"bench task {i}", 'time': due, 'status': 'pending',
+            'priority': 'High', 'category': category_names[0], 'notes': ''
+        }),
+        repeat, setup=lambda i: i
+    )
+
+    pending_ids = db.get_tasks()['id'].tolist()
+    results['update_task_status'] = time_call(
+        lambda task_id: db.update_task_status(task_id, 'completed'),
+        min(repeat, len(pending_ids)), setup=lambda i: pending_ids[i]
+    )
+
+    results['prefetch.run_once'] = time_call(example.prefetcher.run_once, 1)
+    results['prefetch.report'] = time_call(example.prefetcher.report, repeat)
+
+    results['get_analytics_data'] = time_call(db.get_analytics_data, repeat)
+
+    ranking = example.TaskRanking(example.DatabaseManager.get_connection,
+                                  example.DatabaseManager._load_pending)
+    results['ranking.build'] = time_call(ranking.build, 1)
+    results['ranking.top25'] = time_call(lambda: ranking.top(25), repeat)
+    # In-memory operations and the full sort they replace, at 100k pending tasks
+    results['ranking.add.100k'], results['ranking.top25.100k'], results['ranking.sort_values.100k'] = \
+        ranking_at_scale(100_000, repeat, config['seed'])
+
+    trends = example.CompletionTrends(example.DatabaseManager.get_connection,
+                                      example.DatabaseManager._load_completions)
+    results['trends.build'] = time_call(trends.build, 1)
+    results['trends.report'] = time_call(trends.report, repeat)
+    # The array kernels alone, at a million completions
+    results['trends.record.1m'] = time_call(lambda: trends_kernels(1_000_000, config['seed']), 1)
+
+    index = example.DuplicateIndex(
+        example.DatabaseManager.get_connection,
+        lambda: example.get_backend().iter_query("SELECT id, task, notes, status FROM tasks")
+    )
+    results['dedup.build'] = time_call(index.build, 1)
+    results['dedup.similar'] = time_call(
+        lambda i: index.similar(' '.join(TASK_WORDS[i % len(TASK_WORDS):][:2])), repeat,
+        setup=lambda i: i
+    )
+    results['dedup.groups'] = time_call(lambda: index.duplicate_groups(0.6), 1)
+    results['dedup.build.1m'], results['dedup.similar.1m'] = dedup_at_scale(1_000_000, repeat, config['seed'])
+    analytics_data = db.get_analytics_data()
+    if example.snapshot.available():
+        # Columnar path: write a snapshot, then memory-map it and aggregate with Arrow kernels
+        snapshot_dir = os.path.join(workdir, 'analytics_snapshot')
+        results['snapshot.write'] = time_call(lambda: db.write_analytics_snapshot(snapshot_dir), 1)
+        results['snapshot.load'] = time_call(lambda: example.snapshot.load_snapshot(snapshot_dir), repeat)
+        results['analytics.columnar'] = time_call(
+            lambda: example.snapshot.compute_analytics(example.snapshot.load_snapshot(snapshot_dir)),
+            repeat
+        )
+    results['build_analytics_figures'] = time_call(
+        lambda: example.build_analytics_figures(analytics_data), repeat
+    )
+
+    # Serialization alone, from rows read up front, then together with the streamed read
+    export_chunks = list(db.iter_tasks(filter_completed=True))
+    for export_format in EXPORT_FORMATS:
+        results[f'export.{export_format.lower()}'] = time_call(
+            lambda fmt: example.export_tasks(iter(export_chunks), fmt),
+            repeat, setup=lambda i, fmt=export_format: fmt
+        )
+        results[f'export.{export_format.lower()}.streamed'] = time_call(
+            lambda fmt: example.export_tasks(db.iter_tasks(filter_completed=True), fmt),
+            repeat, setup=lambda i, fmt=export_format: fmt
+        )
+
+    results['archive_completed_tasks'] = time_call(db.archive_completed_tasks, 1)
+    results['get_tasks.all.archived'] = time_call(
+        lambda _: db.get_tasks(filter_completed=True), repeat, setup=cold
+    )
+    results['get_analytics_data.archived'] = time_call(db.get_analytics_data, repeat)
+
+    results['save_chat_message'] = time_call(
+        lambda i: example.DatabaseManager.save_chat_message('user', f"message {i}"),
+        repeat, setup=lambda i: i
+    )
+    results['get_chat_history'] = time_call(example.DatabaseManager.get_chat_history, repeat)
+    # Trim chat history to half its size, then reclaim the freed pages
+    retention = maintenance.RetentionPolicy(max_rows=config['chat_messages'] // 2)
+    results['maintenance.run'] = time_call(
+        lambda: maintenance.run_maintenance(example.DatabaseManager.get_connection, db_path, retention), 1
+    )
+    results['clear_chat_history'] = time_call(db.clear_chat_history, 1)
+
+    return results, {'db_path': db_path, 'llm_calls': stub.calls}
+
+
+def check_thresholds(results, thresholds):
+    """Return the benchmarks whose mean exceeds the allowed threshold."""
+    regressions = []
+    for name, limit_ms in thresholds.items():
+        if name in results and results[name]['mean_ms'] > limit_ms:
+            regressions.append({
+                'benchmark': name,
+                'mean_ms': results[name]['mean_ms'],
+                'threshold_ms': limit_ms,
+            })
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='default')
+    parser.add_argument('--tasks', type=int)
+    parser.add_argument('--categories', type=int)
+    parser.add_argument('--days', type=int, help="Spread of task dates in days")
+    parser.add_argument('--chat-messages', type=int)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--thresholds', default=DEFAULT_THRESHOLDS,
+                        help="JSON file mapping profile -> benchmark -> max mean ms")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = dict(PROFILES[args.profile], seed=args.seed)
+    for key in ('tasks', 'categories', 'days', 'chat_messages'):
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
+
+    results, info = run_benchmarks(config, args.repeat)
+
+    thresholds = {}
+    if args.thresholds and os.path.exists(args.thresholds):
+        with open(args.thresholds) as f:
+            thresholds = json.load(f).get(args.profile, {})
+    regressions = check_thresholds(results, thresholds)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'profile': args.profile,
+            'config': config,
+            'repeat': args.repeat,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'llm_calls': info['llm_calls'],
+        },
+        'results': results,
+        'regressions': regressions,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    width = max(len(name) for name in results)
+    for name, stats in results.items():
+        print(f"{name:<{width}}  mean {stats['mean_ms']:>10.3f} ms  "
+              f"max {stats['max_ms']:>10.3f} ms")
+    print(f"\nResults written to {args.output}")
+
+    if regressions:
+        for r in regressions:
+            print(f"REGRESSION: {r['benchmark']} {r['mean_ms']} ms > {r['threshold_ms']} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
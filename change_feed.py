@@ -0,0 +1,279 @@
+"""Append-only change feed for tasks, categories and chat history.
+
+Every write made through DatabaseManager appends a row to `change_log` in
+the same transaction, numbered by an increasing `seq`. Consumers remember
+the last `seq` they processed and ask for what came after it, instead of
+re-reading whole tables. Changes older than a retention period can be
+compacted away. Compaction records the seq it deleted through, so a
+consumer that falls further behind than that can tell, and rebuilds from
+the tables instead of applying what is left.
+
+Run a local feed server for other processes:
+
+    python change_feed.py --port 8765
+
+    GET /changes?since=N&limit=500&timeout=30   long-poll, returns JSON
+    GET /events?since=N                         server-sent events stream
+
+    python change_feed.py --compact-days 30     delete older changes and exit
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from storage import create_backend
+
+STAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def ensure_schema(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            op TEXT NOT NULL,
+            row_id TEXT,
+            payload TEXT,
+            changed_at TEXT NOT NULL
+        )
+    ''')
+    # Latest change to one table, e.g. to tell whether a tasks snapshot is current
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_change_log_table_seq ON change_log(table_name, seq)")
+    # Every change up to compacted_through has been deleted by compact()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log_watermark (
+            id INTEGER PRIMARY KEY,
+            compacted_through INTEGER NOT NULL
+        )
+    ''')
+
+
+def record_change(cursor, table_name, op, row_id=None, payload=None):
+    """Append a change as the last statement of the transaction that makes it.
+
+    Commit right after: on PostgreSQL this holds a change_log lock until then.
+    """
+    if not isinstance(cursor, sqlite3.Cursor):
+        # PostgreSQL hands out sequence values before commit, so concurrent appends could
+        # commit out of seq order and a reader would skip the lower seq for good. Only the
+        # append and its commit wait on this lock; the rest of each transaction, and every
+        # reader, runs concurrently. SQLite already serializes writers.
+        cursor.execute("LOCK TABLE change_log IN EXCLUSIVE MODE")
+    cursor.execute(
+        "INSERT INTO change_log (table_name, op, row_id, payload, changed_at) VALUES (?, ?, ?, ?, ?)",
+        (table_name, op, row_id, json.dumps(payload) if payload is not None else None,
+         datetime.now().strftime(STAMP_FORMAT))
+    )
+
+
+def compact(conn, older_than_days, batch_size=1000, max_batches=50):
+    """Delete changes older than `older_than_days`, oldest first, in batches.
+
+    The latest change is always kept so sequence numbers never go backwards.
+    Each batch deletes everything up to a seq and records it as the
+    watermark in the same transaction. Returns the number of rows deleted.
+    """
+    cutoff = (datetime.now() - timedelta(days=older_than_days)).strftime(STAMP_FORMAT)
+    deleted = 0
+    for _ in range(max_batches):
+        c = conn.cursor()
+        c.execute('''
+            SELECT MAX(seq) FROM (
+                SELECT seq FROM change_log
+                WHERE changed_at < ? AND seq < (SELECT MAX(seq) FROM change_log)
+                ORDER BY seq LIMIT ?
+            ) batch
+        ''', (cutoff, batch_size))
+        through = c.fetchone()[0]
+        if through is None:
+            break
+        c.execute("DELETE FROM change_log WHERE seq <= ?", (through,))
+        count = max(c.rowcount, 0)
+        c.execute('''
+            INSERT INTO change_log_watermark (id, compacted_through) VALUES (1, ?)
+            ON CONFLICT (id) DO UPDATE SET compacted_through = excluded.compacted_through
+        ''', (through,))
+        conn.commit()
+        deleted += count
+        if count < batch_size:
+            break
+    return deleted
+
+
+class ChangeFeed:
+    def __init__(self, get_connection, poll_interval=0.5):
+        self.get_connection = get_connection
+        self.poll_interval = poll_interval
+        # Highest seq this process has refreshed its caches for
+        self.seen_seq = 0
+
+    def latest_seq(self, table_name=None):
+        """Sequence number of the latest change, optionally to one table only."""
+        conn = self.get_connection()
+        c = conn.cursor()
+        if table_name is None:
+            c.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log")
+        else:
+            c.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log WHERE table_name = ?", (table_name,))
+        seq = c.fetchone()[0]
+        conn.close()
+        return seq
+
+    def changes_since(self, seq, limit=500):
+        """Changes with a sequence number above `seq`, oldest first."""
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('''
+            SELECT seq, table_name, op, row_id, payload, changed_at FROM change_log
+            WHERE seq > ? ORDER BY seq LIMIT ?
+        ''', (seq, limit))
+        rows = c.fetchall()
+        conn.close()
+        return [
+            {
+                'seq': row[0],
+                'table': row[1],
+                'op': row[2],
+                'row_id': row[3],
+                'payload': json.loads(row[4]) if row[4] is not None else None,
+                'changed_at': row[5]
+            }
+            for row in rows
+        ]
+
+    def compacted_through(self):
+        """Highest seq deleted by compaction, 0 if nothing has been."""
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute("SELECT COALESCE(MAX(compacted_through), 0) FROM change_log_watermark")
+        seq = c.fetchone()[0]
+        conn.close()
+        return seq
+
+    def missed(self, seq, changes):
+        """Whether changes after `seq` were compacted away before being read.
+
+        `changes` is what changes_since(seq) returned. Compaction deletes a
+        prefix of the log and keeps the latest change, so only a gap right
+        after `seq` can hide deleted changes; the watermark is read only then.
+        """
+        if not changes or changes[0]['seq'] == seq + 1:
+            return False
+        return self.compacted_through() > seq
+
+    def wait_for_changes(self, seq, timeout=30, limit=500, on_poll=None):
+        """Long-poll: return changes after `seq` as soon as there are any.
+
+        Returns an empty list if nothing changed within `timeout` seconds
+        (None waits forever). `on_poll` is called between polls.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changes = self.changes_since(seq, limit)
+            if changes or (deadline is not None and time.monotonic() >= deadline):
+                return changes
+            if on_poll:
+                on_poll()
+            time.sleep(self.poll_interval)
+
+    def catch_up(self):
+        """Advance `seen_seq` to the latest change. Returns True if it moved."""
+        latest = self.latest_seq()
+        if latest > self.seen_seq:
+            self.seen_seq = latest
+            return True
+        return False
+
+
+def make_handler(feed):
+    class ChangeFeedHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            try:
+                since = int(query.get('since', [self.headers.get('Last-Event-ID') or 0])[0])
+                limit = int(query.get('limit', [500])[0])
+                timeout = float(query.get('timeout', [30])[0])
+            except ValueError:
+                self._send_json(400, {'error': 'since, limit and timeout must be numbers'})
+                return
+
+            if url.path == '/changes':
+                changes = feed.wait_for_changes(since, timeout=timeout, limit=limit)
+                last_seq = changes[-1]['seq'] if changes else since
+                self._send_json(200, {'changes': changes, 'last_seq': last_seq})
+            elif url.path == '/events':
+                self._stream_events(since, limit)
+            else:
+                self._send_json(404, {'error': 'not found'})
+
+        def _stream_events(self, since, limit):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            try:
+                while True:
+                    changes = feed.wait_for_changes(since, timeout=15, limit=limit)
+                    if not changes:
+                        # Comment line keeps proxies from closing an idle stream
+                        self.wfile.write(b": keep-alive\n\n")
+                    for change in changes:
+                        self.wfile.write(
+                            f"id: {change['seq']}\nevent: change\ndata: {json.dumps(change)}\n\n".encode()
+                        )
+                        since = change['seq']
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # Client went away
+
+    return ChangeFeedHandler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the task change feed over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--db-url', default=os.getenv("GOGGINS_DB_URL") or
+                        f"sqlite:///{os.getenv('GOGGINS_DB_PATH', 'goggins_bot.db')}")
+    parser.add_argument('--compact-days', type=int,
+                        help="delete changes older than this many days instead of serving")
+    args = parser.parse_args(argv)
+
+    backend = create_backend(args.db_url)
+    conn = backend.connect()
+    ensure_schema(conn.cursor())
+    conn.commit()
+    if args.compact_days is not None:
+        deleted = compact(conn, args.compact_days)
+        conn.close()
+        print(f"Deleted {deleted} changes older than {args.compact_days} days")
+        return
+    conn.close()
+
+    feed = ChangeFeed(backend.connect)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(feed))
+    print(f"Serving change feed on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""Near-duplicate detection for task names and notes.
+
+Task text is turned into a sparse vector of hashed features: whole words
+plus character trigrams of each word, so "gym", "Gym session" and "hit the
+gym" land close together and small typos still match. Notes contribute
+words at a lower weight. Vectors are L2-normalized, so the dot product of
+two vectors is their cosine similarity.
+
+The index is an inverted index from feature to the documents containing
+it. Tasks with the same normalized text share one document. A lookup scans
+the posting lists of the query's rarest features, up to a fixed budget, to
+collect candidates, then reranks them by exact cosine similarity. The cost
+of a lookup therefore depends on the budget rather than the number of tasks.
+
+Usage:
+    python dedup.py --threshold 0.6
+"""
+import argparse
+import functools
+import itertools
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from array import array
+from collections import Counter
+
+from change_feed import ChangeFeed, ensure_schema
+from storage import create_backend
+
+FEATURE_BITS = 22
+FEATURE_MASK = (1 << FEATURE_BITS) - 1
+
+WORD_WEIGHT = 1.0
+TRIGRAM_WEIGHT = 0.4
+NOTES_WEIGHT = 0.3
+
+STOPWORDS = {'a', 'an', 'and', 'at', 'do', 'for', 'in', 'my', 'of', 'on', 'the', 'to', 'with'}
+
+
+def tokenize(text):
+    words = []
+    for word in re.findall(r"[a-z0-9]+", (text or '').lower()):
+        if word in STOPWORDS:
+            continue
+        # Crude plural folding: "sessions" -> "session"
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def _feature(token):
+    return zlib.crc32(token.encode()) & FEATURE_MASK
+
+
+@functools.lru_cache(maxsize=65536)
+def _name_features(word):
+    """Features of a word in a task name: the word itself, then its trigrams."""
+    padded = f"#{word}#"
+    return (_feature('w:' + word),) + tuple(_feature('c:' + padded[i:i + 3]) for i in range(len(padded) - 2))
+
+
+def vectorize(name, notes=''):
+    """Return the normalized sparse vector of a task as {feature: weight}."""
+    weights = {}
+    for word in tokenize(name):
+        # Task names reuse a small vocabulary, so each word is hashed once
+        word_feature, *trigrams = _name_features(word)
+        weights[word_feature] = weights.get(word_feature, 0.0) + WORD_WEIGHT
+        for feature in trigrams:
+            weights[feature] = weights.get(feature, 0.0) + TRIGRAM_WEIGHT
+    for word in tokenize(notes):
+        feature = _feature('w:' + word)
+        weights[feature] = weights.get(feature, 0.0) + NOTES_WEIGHT
+
+    norm = math.sqrt(sum(w * w for w in weights.values()))
+    if not norm:
+        return {}
+    return {feature: w / norm for feature, w in weights.items()}
+
+
+def text_key(name, notes=''):
+    return ' '.join(tokenize(name)) + '|' + ' '.join(tokenize(notes))
+
+
+class DuplicateIndex:
+    """In-memory inverted index over task text, kept current incrementally.
+
+    `get_connection` is used to follow the change feed, so tasks saved or
+    completed by other processes are picked up too. `iter_tasks` returns
+    DataFrame chunks with `id`, `task`, `notes` and `status` columns for the
+    initial build. Completed tasks stay indexed for the duplicate report but
+    are left out of suggestions.
+    """
+
+    def __init__(self, get_connection, iter_tasks, candidate_budget=20000, max_candidates=200):
+        self.get_connection = get_connection
+        self.iter_tasks = iter_tasks
+        self.candidate_budget = candidate_budget
+        self.max_candidates = max_candidates
+        self.feed = ChangeFeed(get_connection)
+        self.ready = False
+        self.seq = 0
+        self.build_seconds = None
+
+        # Documents: vectors are stored flat, document i owning
+        # features[offsets[i]:offsets[i + 1]]
+        self._features = array('I')
+        self._weights = array('f')
+        self._offsets = array('Q', [0])
+        self._task_ids = []
+        self._names = []
+        self._doc_by_key = {}
+        self._postings = {}
+        # Indexed tasks that are no longer pending
+        self._completed = set()
+
+        self._thread = None
+        self._lock = threading.Lock()
+
+        # Latest background duplicate report and its (checked, planned) progress
+        self.report = None
+        self.report_progress = (0, 0)
+        self._report_thread = None
+
+    def __len__(self):
+        return len(self._task_ids)
+
+    def add(self, task_id, name, notes=''):
+        """Index one task. Adding a task that is already indexed does nothing."""
+        key = text_key(name, notes)
+        with self._lock:
+            doc = self._doc_by_key.get(key)
+            if doc is not None:
+                if task_id not in self._task_ids[doc]:
+                    self._task_ids[doc].append(task_id)
+                return doc
+
+            vector = vectorize(name, notes)
+            if not vector:
+                return None
+            doc = len(self._task_ids)
+            self._doc_by_key[key] = doc
+            self._task_ids.append([task_id])
+            self._names.append(name)
+            for feature, weight in vector.items():
+                self._features.append(feature)
+                self._weights.append(weight)
+                postings = self._postings.get(feature)
+                if postings is None:
+                    postings = self._postings[feature] = array('I')
+                postings.append(doc)
+            self._offsets.append(len(self._features))
+            return doc
+
+    def set_status(self, task_id, status):
+        """Track whether an indexed task is still pending."""
+        with self._lock:
+            if status == 'completed':
+                self._completed.add(task_id)
+            else:
+                self._completed.discard(task_id)
+
+    def _score(self, query, doc):
+        start, end = self._offsets[doc], self._offsets[doc + 1]
+        return sum(
+            query.get(feature, 0.0) * weight
+            for feature, weight in zip(self._features[start:end], self._weights[start:end])
+        )
+
+    def _search(self, query, limit, threshold, exclude=None, doc_count=None):
+        # Rarest features first; stop once the scan budget is spent
+        postings = sorted(
+            (self._postings[f] for f in query if f in self._postings), key=len
+        )
+        hits = Counter()
+        budget = self.candidate_budget
+        for plist in postings:
+            if budget <= 0:
+                break
+            # Very common features only contribute their newest entries
+            hits.update(plist[-budget:])
+            budget -= len(plist)
+
+        results = []
+        for doc, _ in hits.most_common(self.max_candidates):
+            if doc == exclude or (doc_count is not None and doc >= doc_count):
+                continue
+            score = self._score(query, doc)
+            if score >= threshold:
+                results.append((score, doc))
+        results.sort(reverse=True)
+        return results[:limit]
+
+    def similar(self, name, notes='', limit=5, threshold=0.5):
+        """Pending tasks similar to the given text, most similar first.
+
+        Returns a list of {'task', 'task_ids', 'score'}; empty until the
+        initial build has finished.
+        """
+        if not self.ready:
+            return []
+        query = vectorize(name, notes)
+        if not query:
+            return []
+        self.sync()
+        matches = {}
+        with self._lock:
+            # Tasks with the same name but different notes are shown once
+            for score, doc in self._search(query, limit * 3, threshold):
+                pending = [task_id for task_id in self._task_ids[doc] if task_id not in self._completed]
+                if not pending:
+                    continue
+                name = self._names[doc]
+                match = matches.setdefault(name, {'task': name, 'task_ids': [], 'score': round(score, 3)})
+                match['task_ids'].extend(pending)
+        return list(matches.values())[:limit]
+
+    def sync(self):
+        """Index tasks inserted, and note status changes, since the last change seen."""
+        while True:
+            changes = self.feed.changes_since(self.seq)
+            if not changes:
+                return
+            if self.feed.missed(self.seq, changes):
+                # Inserts were compacted away before we read them; adding is idempotent
+                self.build()
+                return
+            for change in changes:
+                if change['table'] == 'tasks' and change['payload']:
+                    if change['op'] == 'insert':
+                        self.add(change['row_id'], change['payload'].get('task', ''),
+                                 change['payload'].get('notes') or '')
+                    if change['op'] in ('insert', 'update'):
+                        self.set_status(change['row_id'], change['payload'].get('status'))
+                self.seq = change['seq']
+
+    def build(self):
+        """Index every task, then catch up with writes made during the build."""
+        started = time.perf_counter()
+        self.seq = self.feed.latest_seq()
+        for chunk in self.iter_tasks():
+            columns = chunk[['id', 'task', 'notes', 'status']]
+            for task_id, name, notes, status in columns.itertuples(index=False):
+                self.add(task_id, name, notes or '')
+                self.set_status(task_id, status)
+        self.sync()
+        self.build_seconds = round(time.perf_counter() - started, 3)
+        self.ready = True
+
+    def start(self):
+        """Build the index on a background thread once per process."""
+        with self._lock:
+            if self._thread is None:
+                def run():
+                    try:
+                        self.build()
+                    except Exception as e:
+                        print(f"Duplicate index build failed: {e}")
+
+                self._thread = threading.Thread(target=run, name='duplicate-index', daemon=True)
+                self._thread.start()
+
+    def duplicate_groups(self, threshold=0.6, max_leaders=2000, progress=None):
+        """Group indexed tasks into clusters of near-duplicates.
+
+        The most repeated task not yet grouped leads each group, and only
+        tasks similar to the leader itself join it, so unrelated tasks are
+        not chained together through a common neighbour. Tasks saved more
+        than once lead first, then the newest tasks. At most `max_leaders`
+        lookups are made, so the cost is bounded however large the index is.
+
+        `progress(checked, planned)` is called after each lookup. Returns
+        {'groups', 'checked', 'distinct', 'complete', 'threshold'}, where
+        groups is a list of {'tasks', 'task_ids', 'count'}, largest first,
+        and complete says whether every task was covered within the limit.
+        """
+        # Documents are append-only, so everything below doc_count stays valid
+        # without the lock; saves and suggestions carry on while this runs
+        with self._lock:
+            doc_count = len(self._task_ids)
+            task_ids = self._task_ids[:doc_count]
+            names = self._names[:doc_count]
+
+        repeated = sorted((d for d in range(doc_count) if len(task_ids[d]) > 1),
+                          key=lambda d: len(task_ids[d]), reverse=True)
+        leaders = itertools.chain(repeated, range(doc_count - 1, -1, -1))
+        planned = min(max_leaders, doc_count)
+
+        grouped = set()
+        groups = []
+        checked = 0
+        complete = True
+        for doc in leaders:
+            if doc in grouped:
+                continue
+            if checked >= planned:
+                complete = False
+                break
+            grouped.add(doc)
+            start, end = self._offsets[doc], self._offsets[doc + 1]
+            query = dict(zip(self._features[start:end], self._weights[start:end]))
+            members = [doc] + [
+                other for _, other in self._search(query, self.max_candidates, threshold,
+                                                   exclude=doc, doc_count=doc_count)
+                if other not in grouped
+            ]
+            grouped.update(members)
+            checked += 1
+            if progress:
+                progress(checked, planned)
+
+            group_ids = [task_id for member in members for task_id in task_ids[member]]
+            if len(group_ids) > 1:
+                groups.append({
+                    'tasks': list(dict.fromkeys(names[member] for member in members)),
+                    'task_ids': group_ids,
+                    'count': len(group_ids)
+                })
+        groups.sort(key=lambda group: group['count'], reverse=True)
+        return {'groups': groups, 'checked': checked, 'distinct': doc_count, 'complete': complete,
+                'threshold': threshold}
+
+    def start_report(self, threshold=0.6, max_leaders=2000):
+        """Compute duplicate_groups on a background thread into `report`.
+
+        Only one report runs at a time; returns False if one is already running.
+        """
+        with self._lock:
+            if self.report_running:
+                return False
+            self.report = None
+            self.report_progress = (0, min(max_leaders, len(self._task_ids)))
+
+            def run():
+                try:
+                    self.sync()
+                    self.report = self.duplicate_groups(
+                        threshold, max_leaders,
+                        progress=lambda checked, planned: setattr(self, 'report_progress', (checked, planned))
+                    )
+                except Exception as e:
+                    print(f"Duplicate report failed: {e}")
+
+            self._report_thread = threading.Thread(target=run, name='duplicate-report', daemon=True)
+            self._report_thread.start()
+        return True
+
+    @property
+    def report_running(self):
+        return self._report_thread is not None and self._report_thread.is_alive()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report groups of near-duplicate tasks.")
+    parser.add_argument('--db-url', default=os.getenv("GOGGINS_DB_URL") or
+                        f"sqlite:///{os.getenv('GOGGINS_DB_PATH', 'goggins_bot.db')}")
+    parser.add_argument('--threshold', type=float, default=0.6)
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--max-leaders', type=int, default=2000,
+                        help="at most this many tasks are compared against the rest")
+    args = parser.parse_args(argv)
+
+    backend = create_backend(args.db_url)
+    conn = backend.connect()
+    ensure_schema(conn.cursor())
+    conn.commit()
+    conn.close()
+
+    index = DuplicateIndex(backend.connect, lambda: backend.iter_query("SELECT id, task, notes, status FROM tasks"))
+    index.build()
+    report = index.duplicate_groups(args.threshold, args.max_leaders)
+    groups = report['groups']
+    print(f"Indexed {len(index)} distinct tasks in {index.build_seconds}s; "
+          f"{len(groups)} duplicate groups covering {sum(g['count'] for g in groups)} tasks")
+    if not report['complete']:
+        print(f"Stopped after {report['checked']} lookups; raise --max-leaders to cover every task")
+    for group in groups[:args.top]:
+        names = ', '.join(repr(name) for name in group['tasks'][:5])
+        more = f" (+{len(group['tasks']) - 5} more)" if len(group['tasks']) > 5 else ''
+        print(f"  {group['count']:>6}  {names}{more}")
+
+
+if __name__ == "__main__":
+    main()
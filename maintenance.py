@@ -0,0 +1,301 @@
+"""Chat history retention and database file maintenance.
+
+Retention trims `chat_history` by age, row count and total content size,
+deleting the oldest messages in small batches so no single transaction
+holds the write lock for long. The change log is compacted to its own
+retention period. On SQLite files in `auto_vacuum=INCREMENTAL` mode, pages
+freed by deletes are handed back to the OS a few at a time with
+`PRAGMA incremental_vacuum`, and planner statistics are kept fresh with
+`PRAGMA optimize` and a periodic `ANALYZE`.
+
+Switching an existing file to incremental mode takes one full VACUUM,
+which rewrites the file and blocks every writer while it runs, so it only
+happens when asked for with `--enable-incremental-vacuum`.
+
+Every run returns a report with the file size, fragmentation (free pages
+as a share of all pages) and the time each step took.
+
+Usage:
+    python maintenance.py --max-age-days 90 --max-rows 5000
+    python maintenance.py --enable-incremental-vacuum
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from change_feed import compact, record_change
+
+# SQLite's auto_vacuum setting for INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def ensure_schema(cursor):
+    # Retention deletes oldest-first
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chat_history_timestamp ON chat_history(timestamp)")
+
+
+class RetentionPolicy:
+    """Limits for chat_history and change_log; None means unlimited."""
+
+    def __init__(self, max_age_days=None, max_rows=None, max_bytes=None, change_log_days=30):
+        self.max_age_days = max_age_days
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.change_log_days = change_log_days
+
+    @classmethod
+    def from_env(cls):
+        def limit(name):
+            value = os.getenv(name)
+            return int(value) if value else None
+
+        return cls(
+            max_age_days=limit("GOGGINS_CHAT_RETENTION_DAYS"),
+            max_rows=limit("GOGGINS_CHAT_RETENTION_ROWS"),
+            max_bytes=limit("GOGGINS_CHAT_RETENTION_BYTES"),
+            change_log_days=int(os.getenv("GOGGINS_CHANGE_LOG_RETENTION_DAYS", "30"))
+        )
+
+    def is_unlimited(self):
+        return self.max_age_days is None and self.max_rows is None and self.max_bytes is None
+
+
+def _delete_ids(conn, ids):
+    if not ids:
+        return 0
+    placeholders = ','.join(['?' for _ in ids])
+    c = conn.cursor()
+    c.execute(f"DELETE FROM chat_history WHERE id IN ({placeholders})", ids)
+    record_change(c, 'chat_history', 'delete', payload={'ids': ids})
+    conn.commit()
+    return len(ids)
+
+
+def _oldest(conn, limit, where="1=1", params=()):
+    c = conn.cursor()
+    c.execute(f'''
+        SELECT id, LENGTH(content) FROM chat_history
+        WHERE {where} ORDER BY timestamp ASC LIMIT ?
+    ''', (*params, limit))
+    return c.fetchall()
+
+
+def apply_retention(get_connection, policy, batch_size=200, max_batches=50, pause=0.01):
+    """Delete chat messages outside `policy`, oldest first, in batches.
+
+    Stops after `max_batches` so a backlog is worked off over several runs.
+    Returns the number of rows deleted.
+    """
+    deleted = 0
+    batches = 0
+    conn = get_connection()
+    try:
+        def budget_left():
+            return batches < max_batches
+
+        if policy.max_age_days is not None:
+            # chat_history timestamps come from CURRENT_TIMESTAMP, which is UTC
+            cutoff = (datetime.now(timezone.utc) - timedelta(days=policy.max_age_days)).strftime("%Y-%m-%d %H:%M:%S")
+            while budget_left():
+                rows = _oldest(conn, batch_size, "timestamp < ?", (cutoff,))
+                if not rows:
+                    break
+                deleted += _delete_ids(conn, [row[0] for row in rows])
+                batches += 1
+                time.sleep(pause)
+
+        if policy.max_rows is not None:
+            while budget_left():
+                c = conn.cursor()
+                c.execute("SELECT COUNT(*) FROM chat_history")
+                excess = c.fetchone()[0] - policy.max_rows
+                if excess <= 0:
+                    break
+                rows = _oldest(conn, min(excess, batch_size))
+                deleted += _delete_ids(conn, [row[0] for row in rows])
+                batches += 1
+                time.sleep(pause)
+
+        if policy.max_bytes is not None:
+            while budget_left():
+                c = conn.cursor()
+                c.execute("SELECT COALESCE(SUM(LENGTH(content)), 0) FROM chat_history")
+                excess = c.fetchone()[0] - policy.max_bytes
+                if excess <= 0:
+                    break
+                ids = []
+                for message_id, size in _oldest(conn, batch_size):
+                    ids.append(message_id)
+                    excess -= size or 0
+                    if excess <= 0:
+                        break
+                deleted += _delete_ids(conn, ids)
+                batches += 1
+                time.sleep(pause)
+    finally:
+        conn.close()
+    return deleted
+
+
+def compact_change_log(get_connection, policy):
+    conn = get_connection()
+    try:
+        deleted = compact(conn, policy.change_log_days) if policy.change_log_days is not None else 0
+    finally:
+        conn.close()
+    return {'deleted': deleted}
+
+
+def file_stats(conn, db_path):
+    c = conn.cursor()
+    page_size = c.execute("PRAGMA page_size").fetchone()[0]
+    page_count = c.execute("PRAGMA page_count").fetchone()[0]
+    freelist_count = c.execute("PRAGMA freelist_count").fetchone()[0]
+    return {
+        'file_bytes': os.path.getsize(db_path) if os.path.exists(db_path) else 0,
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_count': freelist_count,
+        'fragmentation_pct': round(freelist_count / page_count * 100, 2) if page_count else 0.0
+    }
+
+
+def run_maintenance(get_connection, db_path, policy, vacuum_pages=500, analyze=True,
+                    enable_incremental=False):
+    """Apply retention, then reclaim free pages and refresh planner statistics.
+
+    `db_path` is the SQLite file, or None on other backends, where only
+    retention and change log compaction run. `enable_incremental` switches
+    the file to incremental auto-vacuum with a full VACUUM if needed.
+    """
+    steps = []
+
+    def step(name, fn):
+        started = time.perf_counter()
+        detail = fn()
+        steps.append({'step': name, 'seconds': round(time.perf_counter() - started, 4), 'detail': detail})
+
+    report = {'started_at': datetime.now().isoformat(timespec='seconds'), 'steps': steps}
+
+    if db_path is None:
+        step('retention', lambda: {'deleted': apply_retention(get_connection, policy)})
+        step('change_log', lambda: compact_change_log(get_connection, policy))
+        return report
+
+    conn = get_connection()
+    try:
+        report['before'] = file_stats(conn, db_path)
+
+        auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if auto_vacuum != AUTO_VACUUM_INCREMENTAL and enable_incremental:
+            # The mode only changes on a full VACUUM; this happens once per file
+            def convert():
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.execute("VACUUM")
+                return {'auto_vacuum': conn.execute("PRAGMA auto_vacuum").fetchone()[0]}
+            step('enable_incremental_vacuum', convert)
+        report['incremental'] = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == AUTO_VACUUM_INCREMENTAL
+
+        if not policy.is_unlimited():
+            step('retention', lambda: {'deleted': apply_retention(get_connection, policy)})
+        step('change_log', lambda: compact_change_log(get_connection, policy))
+
+        if report['incremental']:
+            def incremental_vacuum():
+                free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                # execute() steps the pragma once, freeing a single page; a script runs it to completion
+                conn.executescript(f"PRAGMA incremental_vacuum({int(vacuum_pages)});")
+                free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                return {'pages_freed': free_before - free_after}
+            step('incremental_vacuum', incremental_vacuum)
+
+        def run_pragma(statement):
+            conn.execute(statement).fetchall()
+
+        if analyze:
+            step('analyze', lambda: run_pragma("ANALYZE"))
+        step('optimize', lambda: run_pragma("PRAGMA optimize"))
+        conn.commit()
+
+        report['after'] = file_stats(conn, db_path)
+    finally:
+        conn.close()
+    return report
+
+
+class MaintenanceScheduler:
+    """Runs maintenance on a background thread at a fixed interval.
+
+    It never converts the file to incremental auto-vacuum; that full VACUUM
+    is left to `python maintenance.py --enable-incremental-vacuum`.
+    """
+
+    def __init__(self, get_connection, get_db_path, policy, interval_seconds=3600,
+                 analyze_every_seconds=86400, vacuum_pages=500):
+        self.get_connection = get_connection
+        self.get_db_path = get_db_path
+        self.policy = policy
+        self.interval_seconds = interval_seconds
+        self.analyze_every_seconds = analyze_every_seconds
+        self.vacuum_pages = vacuum_pages
+        self.last_report = None
+        self._last_analyze = 0.0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def run_once(self):
+        analyze = time.monotonic() - self._last_analyze >= self.analyze_every_seconds
+        report = run_maintenance(self.get_connection, self.get_db_path(), self.policy,
+                                 vacuum_pages=self.vacuum_pages, analyze=analyze)
+        if analyze:
+            self._last_analyze = time.monotonic()
+        self.last_report = report
+        return report
+
+    def _loop(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Database maintenance failed: {e}")
+            time.sleep(self.interval_seconds)
+
+    def start(self):
+        """Start the background maintenance thread once per process."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='db-maintenance', daemon=True)
+                self._thread.start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply chat retention and maintain the SQLite file.")
+    parser.add_argument('--db', default=os.getenv("GOGGINS_DB_PATH", "goggins_bot.db"))
+    defaults = RetentionPolicy.from_env()
+    parser.add_argument('--max-age-days', type=int, default=defaults.max_age_days)
+    parser.add_argument('--max-rows', type=int, default=defaults.max_rows)
+    parser.add_argument('--max-bytes', type=int, default=defaults.max_bytes)
+    parser.add_argument('--change-log-days', type=int, default=defaults.change_log_days)
+    parser.add_argument('--vacuum-pages', type=int, default=500)
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help="switch the file to incremental auto-vacuum (one full VACUUM; stop the app first)")
+    args = parser.parse_args(argv)
+
+    policy = RetentionPolicy(args.max_age_days, args.max_rows, args.max_bytes, args.change_log_days)
+    report = run_maintenance(lambda: sqlite3.connect(args.db), args.db, policy,
+                             vacuum_pages=args.vacuum_pages,
+                             enable_incremental=args.enable_incremental_vacuum)
+    before, after = report['before'], report['after']
+    print(f"File size: {before['file_bytes']} -> {after['file_bytes']} bytes")
+    print(f"Fragmentation: {before['fragmentation_pct']}% -> {after['fragmentation_pct']}%")
+    if not report['incremental']:
+        print("Free pages stay in the file until it is switched with --enable-incremental-vacuum")
+    for s in report['steps']:
+        print(f"  {s['step']:<26} {s['seconds']:>8.4f}s  {s['detail'] or ''}")
+
+
+if __name__ == "__main__":
+    main()
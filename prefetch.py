@@ -0,0 +1,224 @@
+"""Speculative pre-generation of task completion messages.
+
+While the app is idle, a background thread asks the LLM for the messages a
+user is likely to see next: the congratulation for finishing a task that
+is coming due, and the wake-up call for finishing it (or a task that has
+just gone overdue) late. Clicking Complete then takes the stored message
+instead of waiting on the LLM.
+
+Stored messages are evicted once they can no longer be used (the task was
+completed, deleted, or went overdue for an on-time message) or once they
+are older than the TTL. Generation is capped per day, and hits, misses,
+generations and evictions are counted per day for the hit-ratio report.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+TIME_FORMAT = "%Y-%m-%d %H:%M"
+STAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+ON_TIME = 'on_time'
+LATE = 'late'
+NOT_COMPLETED = 'not_completed'
+
+
+def ensure_schema(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS prefetched_messages (
+            task_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            content TEXT NOT NULL,
+            message_type TEXT NOT NULL,
+            generated_at TEXT NOT NULL,
+            PRIMARY KEY (task_id, kind)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS prefetch_stats (
+            day TEXT PRIMARY KEY,
+            generated INTEGER NOT NULL DEFAULT 0,
+            hits INTEGER NOT NULL DEFAULT 0,
+            misses INTEGER NOT NULL DEFAULT 0,
+            evicted INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def message_kind(status, task_time, current_time):
+    """Which message a status change at `current_time` calls for."""
+    if status != 'completed':
+        return NOT_COMPLETED
+    return ON_TIME if current_time <= task_time else LATE
+
+
+class MessagePrefetcher:
+    def __init__(self, get_connection, generate, window_hours=6, daily_cap=50,
+                 ttl_hours=24, interval_seconds=300, idle_seconds=30):
+        self.get_connection = get_connection
+        self.generate = generate
+        self.window_hours = window_hours
+        self.daily_cap = daily_cap
+        self.ttl_hours = ttl_hours
+        self.interval_seconds = interval_seconds
+        self.idle_seconds = idle_seconds
+        self.last_activity = 0.0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _bump(self, c, counter, amount=1):
+        if not amount:
+            return
+        c.execute(f'''
+            INSERT INTO prefetch_stats (day, {counter}) VALUES (?, ?)
+            ON CONFLICT (day) DO UPDATE SET {counter} = prefetch_stats.{counter} + excluded.{counter}
+        ''', (datetime.now().strftime("%Y-%m-%d"), amount))
+
+    def touch(self):
+        """Note that a user is waiting on the LLM, postponing background generation."""
+        self.last_activity = time.monotonic()
+
+    def idle(self):
+        return time.monotonic() - self.last_activity >= self.idle_seconds
+
+    def take(self, task_id, kind):
+        """Return the stored (content, message_type) for a task, or None on a miss.
+
+        All stored messages for the task are dropped, since a task's status
+        only changes once.
+        """
+        self.touch()
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute(
+            "SELECT content, message_type FROM prefetched_messages WHERE task_id = ? AND kind = ?",
+            (task_id, kind)
+        )
+        message = c.fetchone()
+        c.execute("DELETE FROM prefetched_messages WHERE task_id = ?", (task_id,))
+        unused = c.rowcount - (1 if message else 0)
+        self._bump(c, 'hits' if message else 'misses')
+        self._bump(c, 'evicted', max(unused, 0))
+        conn.commit()
+        conn.close()
+        return tuple(message) if message else None
+
+    def evict(self, c, now):
+        """Drop stored messages that can no longer be served."""
+        c.execute('''
+            DELETE FROM prefetched_messages
+            WHERE generated_at < ?
+               OR task_id NOT IN (SELECT id FROM tasks WHERE status != 'completed')
+               OR (kind = ? AND task_id IN (SELECT id FROM tasks WHERE time < ?))
+        ''', ((now - timedelta(hours=self.ttl_hours)).strftime(STAMP_FORMAT),
+              ON_TIME, now.strftime(TIME_FORMAT)))
+        evicted = max(c.rowcount, 0)
+        self._bump(c, 'evicted', evicted)
+        return evicted
+
+    def run_once(self, yield_to_users=False):
+        """Evict stale messages, then pre-generate for tasks due within the window.
+
+        With `yield_to_users`, stops early as soon as someone uses the LLM.
+        Returns the number of messages generated.
+        """
+        now = datetime.now()
+        conn = self.get_connection()
+        c = conn.cursor()
+        self.evict(c, now)
+        conn.commit()
+
+        c.execute("SELECT generated FROM prefetch_stats WHERE day = ?", (now.strftime("%Y-%m-%d"),))
+        row = c.fetchone()
+        budget = self.daily_cap - (row[0] if row else 0)
+
+        # Pending tasks due within the window either side of now, nearest first
+        window = timedelta(hours=self.window_hours)
+        c.execute('''
+            SELECT id, task, time FROM tasks
+            WHERE status != 'completed' AND time >= ? AND time <= ?
+        ''', ((now - window).strftime(TIME_FORMAT), (now + window).strftime(TIME_FORMAT)))
+        candidates = sorted(
+            c.fetchall(),
+            key=lambda row: abs((datetime.strptime(row[2], TIME_FORMAT) - now).total_seconds())
+        )
+        c.execute("SELECT task_id, kind FROM prefetched_messages")
+        stored = set(c.fetchall())
+        conn.close()
+
+        generated = 0
+        for task_id, task_name, task_time in candidates:
+            # Overdue tasks can only be completed late
+            kinds = [LATE] if task_time < now.strftime(TIME_FORMAT) else [ON_TIME, LATE]
+            for kind in kinds:
+                if budget <= 0 or (yield_to_users and not self.idle()):
+                    return generated
+                if (task_id, kind) in stored:
+                    continue
+                content, message_type = self.generate(task_name, kind)
+                budget -= 1
+                generated += 1
+
+                conn = self.get_connection()
+                c = conn.cursor()
+                c.execute('''
+                    INSERT INTO prefetched_messages (task_id, kind, content, message_type, generated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (task_id, kind) DO NOTHING
+                ''', (task_id, kind, content, message_type, datetime.now().strftime(STAMP_FORMAT)))
+                self._bump(c, 'generated')
+                conn.commit()
+                conn.close()
+        return generated
+
+    def report(self):
+        """Counters for today and all time, with hit ratios."""
+        conn = self.get_connection()
+        c = conn.cursor()
+        c.execute('''
+            SELECT COALESCE(SUM(generated), 0), COALESCE(SUM(hits), 0),
+                   COALESCE(SUM(misses), 0), COALESCE(SUM(evicted), 0)
+            FROM prefetch_stats
+        ''')
+        total = c.fetchone()
+        c.execute("SELECT generated, hits, misses, evicted FROM prefetch_stats WHERE day = ?",
+                  (datetime.now().strftime("%Y-%m-%d"),))
+        today = c.fetchone() or (0, 0, 0, 0)
+        c.execute("SELECT COUNT(*) FROM prefetched_messages")
+        stored = c.fetchone()[0]
+        conn.close()
+
+        def summarize(row):
+            generated, hits, misses, evicted = row
+            lookups = hits + misses
+            return {
+                'generated': generated,
+                'hits': hits,
+                'misses': misses,
+                'evicted': evicted,
+                'hit_ratio': round(hits / lookups, 3) if lookups else None
+            }
+
+        return {
+            'today': summarize(today),
+            'total': summarize(total),
+            'stored': stored,
+            'daily_cap': self.daily_cap
+        }
+
+    def _loop(self):
+        while True:
+            # Only use the LLM while nobody is waiting on it
+            if self.idle():
+                try:
+                    self.run_once(yield_to_users=True)
+                except Exception as e:
+                    print(f"Message prefetch failed: {e}")
+            time.sleep(self.interval_seconds)
+
+    def start(self):
+        """Start the background prefetch thread once per process."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='message-prefetch', daemon=True)
+                self._thread.start()
@@ -0,0 +1,248 @@
+"""Ranked "battle plan" ordering of pending tasks.
+
+A task's score combines its priority, how close its deadline is and
+whether it is already overdue:
+
+    score = priority_weight * priority
+            - deadline_weight * hours_until_due
+            + overdue_boost * (1 if overdue else 0)
+
+Hours until due is `due - now`, so the `now` part adds the same amount to
+every task and never changes the order. Each task can therefore be keyed
+once, by `priority_weight * priority - deadline_weight * due_hours`, and
+kept in a heap. Overdue tasks live in a second heap, since they all share
+the boost. A third heap, ordered by due time, moves tasks into the overdue
+heap as their deadlines pass. Adding, completing and moving a task are all
+O(log n). The top N is read from both heaps best-first in O(N log N)
+without sorting the full list.
+
+Completed or re-scored tasks are deleted lazily: their old heap entries
+are skipped when met and are dropped in bulk once they make up half of a
+heap.
+"""
+import heapq
+import itertools
+import threading
+from datetime import datetime
+
+from change_feed import ChangeFeed
+
+TIME_FORMAT = "%Y-%m-%d %H:%M"
+
+PRIORITY_VALUES = {'Low': 1, 'Medium': 2, 'High': 3}
+
+
+def _due_hours(task_time):
+    return datetime.strptime(task_time, TIME_FORMAT).timestamp() / 3600
+
+
+def _best_first(heap, is_current):
+    """Yield the current entries of a heap in order, without popping it."""
+    if not heap:
+        return
+    frontier = [(heap[0], 0)]
+    while frontier:
+        entry, i = heapq.heappop(frontier)
+        if is_current(entry):
+            yield entry
+        for child in (2 * i + 1, 2 * i + 2):
+            if child < len(heap):
+                heapq.heappush(frontier, (heap[child], child))
+
+
+class TaskRanking:
+    """Pending tasks ordered by score, kept current from the change feed.
+
+    `load_pending` returns DataFrame chunks with the `id`, `time`,
+    `priority` and `category` columns of every pending task.
+    """
+
+    def __init__(self, get_connection, load_pending, priority_weight=24.0,
+                 deadline_weight=1.0, overdue_boost=48.0):
+        self.load_pending = load_pending
+        self.priority_weight = priority_weight
+        self.deadline_weight = deadline_weight
+        self.overdue_boost = overdue_boost
+        self.feed = ChangeFeed(get_connection)
+        self.ready = False
+        self.seq = 0
+        self._version = itertools.count()
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # task_id -> (version, overdue, neg_key, due_hours, priority, category)
+        self._tasks = {}
+        # Heap entries are (neg_key, due_hours, task_id, version)
+        self._pending = []
+        self._overdue = []
+        self._by_due = []
+        self._stale = 0
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def __contains__(self, task_id):
+        return task_id in self._tasks
+
+    def key(self, due_hours, priority):
+        return self.priority_weight * PRIORITY_VALUES.get(priority, 0) - self.deadline_weight * due_hours
+
+    def score(self, task_time, priority, now=None):
+        """The full score of a task at `now`, for display and checks."""
+        now_hours = (now or datetime.now()).timestamp() / 3600
+        due_hours = _due_hours(task_time)
+        overdue = self.overdue_boost if due_hours < now_hours else 0.0
+        return self.key(due_hours, priority) + self.deadline_weight * now_hours + overdue
+
+    def _add(self, task_id, task_time, priority, category, now_hours):
+        if task_id in self._tasks:
+            self._stale += 1
+        due_hours = _due_hours(task_time)
+        neg_key = -self.key(due_hours, priority)
+        version = next(self._version)
+        overdue = due_hours < now_hours
+        self._tasks[task_id] = (version, overdue, neg_key, due_hours, priority, category)
+        entry = (neg_key, due_hours, task_id, version)
+        if overdue:
+            heapq.heappush(self._overdue, entry)
+        else:
+            heapq.heappush(self._pending, entry)
+            heapq.heappush(self._by_due, (due_hours, task_id, version))
+
+    def _remove(self, task_id):
+        if self._tasks.pop(task_id, None) is not None:
+            self._stale += 1
+
+    def add(self, task_id, task_time, priority, category):
+        """Rank a pending task, replacing any earlier entry for it."""
+        with self._lock:
+            self._add(task_id, task_time, priority, category, datetime.now().timestamp() / 3600)
+            self._compact()
+
+    def remove(self, task_id):
+        """Stop ranking a task, e.g. once it is completed."""
+        with self._lock:
+            self._remove(task_id)
+            self._compact()
+
+    def _advance(self, now_hours):
+        # Move tasks whose deadline has passed into the overdue heap
+        while self._by_due and self._by_due[0][0] < now_hours:
+            due_hours, task_id, version = heapq.heappop(self._by_due)
+            task = self._tasks.get(task_id)
+            if task is None or task[0] != version:
+                continue
+            _, _, neg_key, _, priority, category = task
+            self._tasks[task_id] = (version, True, neg_key, due_hours, priority, category)
+            heapq.heappush(self._overdue, (neg_key, due_hours, task_id, version))
+            # Its entry in the pending heap is now stale
+            self._stale += 1
+
+    def _compact(self):
+        live = len(self._tasks)
+        if self._stale <= max(live, 1024):
+            return
+        self._pending = []
+        self._overdue = []
+        self._by_due = []
+        for task_id, (version, overdue, neg_key, due_hours, _, _) in self._tasks.items():
+            entry = (neg_key, due_hours, task_id, version)
+            if overdue:
+                self._overdue.append(entry)
+            else:
+                self._pending.append(entry)
+                self._by_due.append((due_hours, task_id, version))
+        for heap in (self._pending, self._overdue, self._by_due):
+            heapq.heapify(heap)
+        self._stale = 0
+
+    def top(self, n=None, categories=None, priorities=None, now=None):
+        """Ids of the `n` highest-scoring pending tasks (all if None), best first.
+
+        `categories` and `priorities` restrict the result when given.
+        """
+        self.sync()
+        now_hours = (now or datetime.now()).timestamp() / 3600
+        categories = set(categories) if categories else None
+        priorities = set(priorities) if priorities else None
+
+        with self._lock:
+            self._advance(now_hours)
+            tasks = self._tasks
+
+            def current(overdue):
+                def is_current(entry):
+                    task = tasks.get(entry[2])
+                    return task is not None and task[0] == entry[3] and task[1] == overdue
+                return is_current
+
+            boost = self.overdue_boost
+            ranked = heapq.merge(
+                ((neg_key - boost, due, task_id) for neg_key, due, task_id, _ in
+                 _best_first(self._overdue, current(True))),
+                ((neg_key, due, task_id) for neg_key, due, task_id, _ in
+                 _best_first(self._pending, current(False)))
+            )
+            result = []
+            for _, _, task_id in ranked:
+                if n is not None and len(result) >= n:
+                    break
+                _, _, _, _, priority, category = tasks[task_id]
+                if categories is not None and category not in categories:
+                    continue
+                if priorities is not None and priority not in priorities:
+                    continue
+                result.append(task_id)
+            return result
+
+    def build(self):
+        """Load every pending task, then catch up with the change feed."""
+        seq = self.feed.latest_seq()
+        now_hours = datetime.now().timestamp() / 3600
+        with self._lock:
+            self._reset()
+            for chunk in self.load_pending():
+                for task_id, task_time, priority, category in \
+                        chunk[['id', 'time', 'priority', 'category']].itertuples(index=False):
+                    self._add(task_id, task_time, priority, category, now_hours)
+            self.seq = seq
+        self.ready = True
+        self._apply_changes()
+
+    def sync(self):
+        """Apply task inserts and status changes made since the last change seen."""
+        with self._sync_lock:
+            if not self.ready:
+                self.build()
+            else:
+                self._apply_changes()
+
+    def _apply_changes(self):
+        while True:
+            changes = self.feed.changes_since(self.seq)
+            if not changes:
+                return
+            if self.feed.missed(self.seq, changes):
+                # Inserts or completions were compacted away before we read them
+                self.build()
+                return
+            now_hours = datetime.now().timestamp() / 3600
+            with self._lock:
+                for change in changes:
+                    payload = change['payload'] or {}
+                    if change['table'] != 'tasks':
+                        continue
+                    if change['op'] == 'insert' and payload.get('status') != 'completed':
+                        self._add(change['row_id'], payload['time'], payload['priority'],
+                                  payload['category'], now_hours)
+                    elif change['op'] == 'update':
+                        if payload.get('status') == 'completed':
+                            self._remove(change['row_id'])
+                        elif 'priority' in payload:
+                            self._add(change['row_id'], payload['time'], payload['priority'],
+                                      payload['category'], now_hours)
+                self._compact()
+            self.seq = changes[-1]['seq']
+
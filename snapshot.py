@@ -0,0 +1,224 @@
+"""Columnar analytics snapshots of the tasks table.
+
+A snapshot is a directory of Arrow IPC files, one per month of due time
+(`tasks-YYYY-MM.arrow`), plus a `manifest.json` recording the change-log
+sequence number of the latest task change it includes. Category, status and priority are
+dictionary-encoded and the time columns are real timestamps, so the files
+can be memory-mapped and aggregated with Arrow compute kernels without
+building object-dtype DataFrames.
+
+Needs the optional `pyarrow` package.
+
+Usage:
+    python snapshot.py --dir analytics_snapshot
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from archive import tasks_source
+from change_feed import ChangeFeed
+from storage import create_backend
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # Snapshots are optional; callers fall back to SQL
+    pa = None
+    pc = None
+
+MANIFEST = 'manifest.json'
+DICTIONARY_COLUMNS = ('status', 'priority', 'category')
+TIMESTAMP_COLUMNS = ('time', 'created_at', 'completed_at')
+
+
+def available():
+    return pa is not None
+
+
+def _to_arrow(chunk):
+    """Convert one chunk of task rows, with the same column types for every chunk."""
+    for column in TIMESTAMP_COLUMNS:
+        if column in chunk:
+            # pandas picks seconds for a column that is NULL throughout the chunk
+            chunk[column] = pd.to_datetime(chunk[column]).astype('datetime64[us]')
+    table = pa.Table.from_pandas(chunk, preserve_index=False)
+    # Text comes out as null-typed when all NULL, and as large_string on newer pandas
+    for index, field in enumerate(table.schema):
+        if pa.types.is_null(field.type) or pa.types.is_large_string(field.type):
+            table = table.set_column(index, field.name, table[field.name].cast(pa.string()))
+    return table
+
+
+def _dictionary_encode(table):
+    for column in DICTIONARY_COLUMNS:
+        index = table.schema.get_field_index(column)
+        table = table.set_column(index, column, pc.dictionary_encode(table[column]))
+    return table
+
+
+def write_snapshot(directory, task_chunks, seq):
+    """Write DataFrame chunks of tasks as a month-partitioned snapshot.
+
+    The new snapshot replaces `directory` only once it is complete, so
+    readers never see a half-written one.
+    """
+    started = time.perf_counter()
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.snapshot_', dir=parent)
+
+    parts = {}
+    for chunk in task_chunks:
+        if chunk.empty:
+            continue
+        table = _to_arrow(chunk)
+        months = pc.strftime(table['time'], format='%Y-%m')
+        for month in pc.unique(months).to_pylist():
+            parts.setdefault(month, []).append(table.filter(pc.equal(months, month)))
+
+    rows = {}
+    for month, tables in sorted(parts.items()):
+        # IPC files hold one dictionary per column, so encode each month in one go
+        table = _dictionary_encode(pa.concat_tables(tables).combine_chunks())
+        with pa.OSFile(os.path.join(staging, f"tasks-{month}.arrow"), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        rows[month] = table.num_rows
+
+    with open(os.path.join(staging, MANIFEST), 'w') as f:
+        json.dump({
+            'seq': seq,
+            'written_at': datetime.now().isoformat(timespec='seconds'),
+            'rows': sum(rows.values()),
+            'partitions': dict(sorted(rows.items()))
+        }, f, indent=2)
+
+    # Swap the finished snapshot into place
+    old = None
+    if os.path.exists(directory):
+        old = tempfile.mkdtemp(prefix='.snapshot_old_', dir=parent)
+        os.rename(directory, os.path.join(old, 'snapshot'))
+    os.rename(staging, directory)
+    if old:
+        shutil.rmtree(old, ignore_errors=True)
+
+    return {
+        'rows': sum(rows.values()),
+        'partitions': len(rows),
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def load_snapshot(directory):
+    """Memory-map every partition and return them as one Arrow table."""
+    manifest = read_manifest(directory)
+    if manifest is None:
+        return None
+    tables = []
+    for month in manifest['partitions']:
+        source = pa.memory_map(os.path.join(directory, f"tasks-{month}.arrow"), 'r')
+        tables.append(pa.ipc.open_file(source).read_all())
+    if not tables:
+        return None
+    return pa.concat_tables(tables, promote_options='permissive').unify_dictionaries()
+
+
+def _count_by(table, column):
+    counts = table.group_by(column).aggregate([([], 'count_all')])
+    series = pd.Series(
+        counts['count_all'].to_numpy(),
+        index=pd.Index(counts[column].cast(pa.string()).to_pylist(), name=column),
+        name='count'
+    )
+    return series.sort_values(ascending=False, kind='stable')
+
+
+def compute_analytics(table, now=None):
+    """Compute the dashboard aggregates from a snapshot table."""
+    now = now or datetime.now()
+    completed = pc.equal(table['status'].cast(pa.string()), 'completed')
+    due = table['time']
+
+    def count(mask):
+        return pc.sum(pc.cast(mask, pa.int64())).as_py() or 0
+
+    week_ago = pa.scalar(now - timedelta(days=7), type=due.type)
+    two_weeks_ago = pa.scalar(now - timedelta(days=14), type=due.type)
+    recent = pc.greater_equal(due, week_ago)
+    previous = pc.and_(pc.greater_equal(due, two_weeks_ago), pc.less(due, week_ago))
+
+    summary = {
+        'total_tasks': table.num_rows,
+        'completed_tasks': count(completed),
+        'overdue_tasks': count(pc.and_(pc.invert(completed),
+                                       pc.less(due, pa.scalar(now, type=due.type)))),
+        'recent_count': count(recent),
+        'recent_completed': count(pc.and_(recent, completed)),
+        'previous_count': count(previous),
+        'previous_completed': count(pc.and_(previous, completed))
+    }
+
+    # Completion rate by category
+    by_category = pa.table({
+        'category': table['category'].cast(pa.string()),
+        'completed': pc.cast(completed, pa.float64())
+    }).group_by('category').aggregate([('completed', 'mean')])
+    category_completion = pd.DataFrame(
+        {'status': (by_category['completed_mean'].to_numpy() * 100).round(2)},
+        index=pd.Index(by_category['category'].to_pylist(), name='category')
+    ).sort_index()
+
+    # Tasks created per day
+    created = pa.table({'date': pc.cast(table['created_at'], pa.date32())})
+    daily = created.group_by('date').aggregate([([], 'count_all')]).sort_by('date')
+    daily_tasks = pd.DataFrame({
+        'date': daily['date'].to_pylist(),
+        'count': daily['count_all'].to_numpy()
+    })
+
+    return {
+        'summary': summary,
+        'category_completion': category_completion,
+        'daily_tasks': daily_tasks,
+        'category_counts': _count_by(table, 'category'),
+        'priority_counts': _count_by(table, 'priority')
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a columnar snapshot of all tasks.")
+    parser.add_argument('--dir', default=os.getenv("GOGGINS_SNAPSHOT_DIR", "analytics_snapshot"))
+    parser.add_argument('--db-url', default=os.getenv("GOGGINS_DB_URL") or
+                        f"sqlite:///{os.getenv('GOGGINS_DB_PATH', 'goggins_bot.db')}")
+    args = parser.parse_args(argv)
+
+    if not available():
+        raise SystemExit("pyarrow is required: pip install pyarrow")
+
+    backend = create_backend(args.db_url)
+    seq = ChangeFeed(backend.connect).latest_seq('tasks')
+    conn = backend.connect()
+    source = tasks_source(conn.cursor())
+    conn.close()
+    report = write_snapshot(args.dir, backend.iter_query(f"SELECT * FROM {source} AS tasks"), seq)
+    print(f"Wrote {report['rows']} tasks in {report['partitions']} partitions "
+          f"to {args.dir} ({report['seconds']}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""Lateness, on-time streak and slip-heatmap analytics over completed tasks.
+
+Every completed task contributes a due time and a completion time, kept as
+int64 epoch seconds in two growable NumPy arrays ordered by completion.
+The statistics are reduced with array kernels (`searchsorted`, `bincount`,
+run lengths over a boolean mask), so a full build over a million
+completions takes a fraction of a second. After that, completions found in
+the change feed are folded into the running aggregates without revisiting
+older ones.
+
+Times are the naive local strings stored in the database, read as if they
+were UTC, so weekdays and hours come out in the user's local time.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from change_feed import ChangeFeed
+
+TIME_FORMAT = "%Y-%m-%d %H:%M"
+STAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+# Lateness buckets, in hours after the due time (negative is early)
+LATENESS_EDGES_HOURS = np.array([-24, -6, -1, 0, 1, 6, 24, 72])
+LATENESS_LABELS = [
+    '> 1 day early', '6-24h early', '1-6h early', '< 1h early',
+    '< 1h late', '1-6h late', '6-24h late', '1-3 days late', '> 3 days late'
+]
+
+
+def to_epoch(values, fmt):
+    """Parse time strings into int64 epoch seconds."""
+    return pd.to_datetime(pd.Series(values), format=fmt).to_numpy().astype('datetime64[s]').astype(np.int64)
+
+
+def _runs(on_time):
+    """Run lengths of True in a boolean array: (leading, longest, trailing)."""
+    n = len(on_time)
+    misses = np.flatnonzero(~on_time)
+    if len(misses) == 0:
+        return n, n, n
+    gaps = np.diff(np.concatenate(([-1], misses, [n]))) - 1
+    return int(misses[0]), int(gaps.max()), int(n - 1 - misses[-1])
+
+
+def slot_of(due):
+    """Weekday-hour slot (0..167, Monday 00:00 first) of epoch seconds."""
+    days, seconds = np.divmod(due, 86400)
+    # 1970-01-01 was a Thursday
+    return ((days + 3) % 7) * 24 + seconds // 3600
+
+
+class CompletionTrends:
+    """Running completion statistics, built once and then kept current from the change feed.
+
+    `load_completions` returns DataFrame chunks with `time` and
+    `completed_at` columns, one row per completed task.
+    """
+
+    def __init__(self, get_connection, load_completions):
+        self.load_completions = load_completions
+        self.feed = ChangeFeed(get_connection)
+        self.ready = False
+        self.seq = 0
+        # Completions up to here came from the initial load, not the feed
+        self._loaded_until = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._due = np.empty(1024, dtype=np.int64)
+        self._done = np.empty(1024, dtype=np.int64)
+        self._size = 0
+        self._histogram = np.zeros(len(LATENESS_LABELS), dtype=np.int64)
+        self._slot_total = np.zeros(7 * 24, dtype=np.int64)
+        self._slot_late = np.zeros(7 * 24, dtype=np.int64)
+        self._current_streak = 0
+        self._longest_streak = 0
+
+    def __len__(self):
+        return self._size
+
+    def _append(self, due, done):
+        needed = self._size + len(due)
+        if needed > len(self._due):
+            capacity = max(needed, 2 * len(self._due))
+            self._due = np.resize(self._due, capacity)
+            self._done = np.resize(self._done, capacity)
+        self._due[self._size:needed] = due
+        self._done[self._size:needed] = done
+        self._size = needed
+
+    def record(self, due, done):
+        """Fold completions (epoch second arrays) into the statistics.
+
+        Completions must arrive after the ones already recorded.
+        """
+        due = np.asarray(due, dtype=np.int64)
+        done = np.asarray(done, dtype=np.int64)
+        if len(due) == 0:
+            return
+        order = np.argsort(done, kind='stable')
+        due, done = due[order], done[order]
+
+        lateness_hours = (done - due) / 3600
+        late = done > due
+        slots = slot_of(due)
+        with self._lock:
+            self._append(due, done)
+            self._histogram += np.bincount(
+                np.searchsorted(LATENESS_EDGES_HOURS, lateness_hours, side='left'),
+                minlength=len(LATENESS_LABELS)
+            )
+            self._slot_total += np.bincount(slots, minlength=7 * 24)
+            self._slot_late += np.bincount(slots[late], minlength=7 * 24)
+
+            leading, longest, trailing = _runs(~late)
+            if leading == len(late):
+                self._current_streak += leading
+            else:
+                self._longest_streak = max(self._longest_streak, self._current_streak + leading)
+                self._current_streak = trailing
+            self._longest_streak = max(self._longest_streak, longest, self._current_streak)
+
+    def build(self):
+        """Load every completed task, then catch up with the change feed."""
+        seq = self.feed.latest_seq()
+        dues, dones = [], []
+        for chunk in self.load_completions():
+            chunk = chunk.dropna(subset=['completed_at'])
+            dues.append(to_epoch(chunk['time'], TIME_FORMAT))
+            dones.append(to_epoch(chunk['completed_at'], STAMP_FORMAT))
+        with self._lock:
+            self._reset()
+            self.seq = seq
+        if dues:
+            self.record(np.concatenate(dues), np.concatenate(dones))
+        self._loaded_until = int(self._done[self._size - 1]) if self._size else None
+        self.ready = True
+        self._apply_changes()
+
+    def sync(self):
+        """Record tasks completed since the last change seen. Returns how many."""
+        with self._sync_lock:
+            if not self.ready:
+                self.build()
+                return self._size
+            return self._apply_changes()
+
+    def _apply_changes(self):
+        recorded = 0
+        while True:
+            changes = self.feed.changes_since(self.seq)
+            if not changes:
+                return recorded
+            if self.feed.missed(self.seq, changes):
+                # Completions were compacted away before we read them
+                self.build()
+                return self._size
+            completed = [
+                change['payload'] for change in changes
+                if change['table'] == 'tasks' and change['op'] == 'update'
+                and change['payload'] and change['payload'].get('completed_at')
+            ]
+            if completed:
+                due = to_epoch([payload['time'] for payload in completed], TIME_FORMAT)
+                done = to_epoch([payload['completed_at'] for payload in completed], STAMP_FORMAT)
+                if self._loaded_until is not None:
+                    # Skip tasks completed while the initial load was running
+                    fresh = done > self._loaded_until
+                    due, done = due[fresh], done[fresh]
+                self.record(due, done)
+                recorded += len(done)
+            self.seq = changes[-1]['seq']
+
+    def report(self):
+        """Current statistics; lateness figures are in minutes."""
+        with self._lock:
+            size = self._size
+            lateness = (self._done[:size] - self._due[:size]) / 60
+            histogram = self._histogram.copy()
+            slot_total = self._slot_total.copy()
+            slot_late = self._slot_late.copy()
+            current_streak, longest_streak = self._current_streak, self._longest_streak
+
+        late = lateness[lateness > 0]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            slip_rate = np.where(slot_total > 0, slot_late / slot_total * 100, np.nan)
+
+        return {
+            'completed': size,
+            'on_time_rate': round(float((lateness <= 0).mean() * 100), 1) if size else None,
+            'mean_lateness': round(float(lateness.mean()), 1) if size else None,
+            'median_lateness': round(float(np.median(lateness)), 1) if size else None,
+            'mean_late_by': round(float(late.mean()), 1) if len(late) else None,
+            'p90_late_by': round(float(np.percentile(late, 90)), 1) if len(late) else None,
+            'current_streak': current_streak,
+            'longest_streak': longest_streak,
+            'lateness_distribution': pd.DataFrame({'bucket': LATENESS_LABELS, 'count': histogram}),
+            # Share of completions that were late, by due weekday (rows) and hour (columns)
+            'slip_heatmap': pd.DataFrame(slip_rate.reshape(7, 24).round(1), index=WEEKDAYS, columns=range(24)),
+            'slot_counts': pd.DataFrame(slot_total.reshape(7, 24), index=WEEKDAYS, columns=range(24))
+        }